@@ -6,12 +6,55 @@ import time
 
 st.set_page_config(page_title="AI Alcohol Label Verification", layout="wide")
 
-if "slib" not in st.session_state:
-    with st.spinner("Initializing Local OCR & CV Engine..."):
-        st.session_state.slib = SystemLib()
+@st.cache_resource(show_spinner="Initializing Local OCR & CV Engine...")
+def get_slib():
+    # One SystemLib (and one set of OCR model weights) shared across all
+    # sessions and reruns; per-session state stays in st.session_state below
+    return SystemLib()
 
-if "all_results" not in st.session_state:
-    st.session_state.all_results = []
+slib = get_slib()
+
+DISPLAY_COLUMNS = {"field": "Requirement", "app": "Reference (App)",
+                   "label_val": "Detected on Label", "status": "Status"}
+
+def comparison_preview(comps):
+    """Display-ready copy of one label's comparison rows"""
+    return comps.drop(columns=["result_idx"]).rename(columns=DISPLAY_COLUMNS).reset_index(drop=True)
+
+def store_results(results):
+    """Convert fresh verification results to frames plus per-label display
+    tables, built once here (and patched on edit) rather than recreated for
+    every expander on every rerun."""
+    results_df, comparisons_df = results_to_frames(results)
+    st.session_state.results_df = results_df
+    st.session_state.comparisons_df = comparisons_df
+    st.session_state.previews = {idx: comparison_preview(df)
+                                 for idx, df in comparisons_df.groupby("result_idx")}
+
+def results_to_frames(results):
+    """Split list-of-dicts verification results into two SoA DataFrames:
+    one row per label, plus a comparisons table keyed by result index."""
+    results_df = pd.DataFrame(
+        [{k: r[k] for k in ("label_file", "app_file", "ai_status", "final_status",
+                            "is_human_decision", "processing_time", "category")} for r in results],
+        columns=["label_file", "app_file", "ai_status", "final_status",
+                 "is_human_decision", "processing_time", "category"])
+    comparisons_df = pd.DataFrame(
+        [{"result_idx": idx, **comp} for idx, r in enumerate(results) for comp in r["comparisons"]],
+        columns=["result_idx", "field", "app", "label_val", "status"])
+    return results_df, comparisons_df
+
+@st.cache_data(show_spinner=False, persist="disk")
+def verify_label_cached(label_bytes, name, library_digest):
+    # Keyed by the label's content hash plus a digest of the application
+    # library, so re-uploading the same image skips OCR entirely while any
+    # library edit invalidates previous verdicts
+    return get_slib().verify_label_bytes(label_bytes, name)
+
+if "results_df" not in st.session_state:
+    st.session_state.results_df = None
+    st.session_state.comparisons_df = None
+    st.session_state.previews = {}
 
 if "uploader_key" not in st.session_state:
     st.session_state.uploader_key = 0
@@ -40,12 +83,12 @@ with tab1:
             # Use batch processing for faster ingestion
             if len(app_files) > 5:
                 status_text.text(f"Batch processing {len(app_files)} applications...")
-                st.session_state.slib.ingest_documents_batch(app_files)
+                slib.ingest_documents_batch(app_files)
                 progress_bar.progress(1.0)
             else:
                 for i, f in enumerate(app_files):
                     status_text.text(f"Indexing {f.name}...")
-                    st.session_state.slib.ingest_document(f)
+                    slib.ingest_document(f)
                     progress_bar.progress((i + 1) / len(app_files))
             
             elapsed = time.time() - start_time
@@ -76,50 +119,47 @@ with tab2:
     )
     
     if st.button("Start Analysis", type="primary"):
-        if label_files and st.session_state.slib.applications:
-            st.session_state.all_results = []
+        if label_files and slib.applications:
             progress_bar = st.progress(0)
             status_text = st.empty()
             start_time = time.time()
-            
+
             # Use batch processing for better performance
             if len(label_files) > 5:
                 status_text.text(f"Batch processing {len(label_files)} labels...")
-                st.session_state.all_results = st.session_state.slib.verify_labels_batch(label_files)
+                results = slib.verify_labels_batch(label_files)
                 progress_bar.progress(1.0)
             else:
+                results = []
+                library_digest = slib.library_digest()
                 for i, f in enumerate(label_files):
                     status_text.text(f"Analyzing {f.name}...")
-                    st.session_state.all_results.append(st.session_state.slib.verify_label(f))
+                    results.append(verify_label_cached(f.getvalue(), f.name, library_digest))
                     progress_bar.progress((i + 1) / len(label_files))
-            
-            elapsed = time.time() - start_time
-            #avg_time = elapsed / len(label_files)
 
-            avg_time = sum(r.get("processing_time", 0) for r in st.session_state.all_results) / len(label_files)
-            
-            #status_text.success(f"Processed {len(label_files)} labels in {elapsed:.2f}s (avg: {avg_time:.2f}s/label)")
-            #time.sleep(10)
+            store_results(results)
             st.rerun()
         else: st.error("Upload labels and ensure library is built.")
 
-    if st.session_state.all_results:
-        avg_t = sum(r.get("processing_time", 0) for r in st.session_state.all_results) / len(st.session_state.all_results)
-        pending = len([r for r in st.session_state.all_results if r.get("ai_status") == "Fail" and not r.get("is_human_decision")])
-        
+    if st.session_state.results_df is not None and len(st.session_state.results_df):
+        results_df = st.session_state.results_df
+        comparisons_df = st.session_state.comparisons_df
+        avg_t = results_df["processing_time"].mean()
+        pending = int(((results_df["ai_status"] == "Fail") & ~results_df["is_human_decision"]).sum())
+
         if len(label_files) > 5:
             avg_t=avg_t / len(label_files)
 
         c1, c2, c3 = st.columns(3)
         c1.metric("Avg. Speed", f"{avg_t:.2f}s")
-        c2.metric("Batch Size", len(st.session_state.all_results))
+        c2.metric("Batch Size", len(results_df))
         c3.metric("Review Required", pending)
-        
+
         st.divider()
 
-        for idx, res in enumerate(st.session_state.all_results):
+        for idx, res in results_df.iterrows():
             # Show all results, but expand the ones that failed
-            is_fail = res.get("ai_status") == "Fail" and not res.get("is_human_decision")
+            is_fail = res["ai_status"] == "Fail" and not res["is_human_decision"]
             with st.expander(f"{'⚠️' if is_fail else '✅'} Label: {res['label_file']} (Result: {res['final_status']})", expanded=is_fail):
                 col1, col2 = st.columns([1, 2])
                 with col1:
@@ -128,62 +168,57 @@ with tab2:
                 with col2:
                     # Check if in editing mode
                     is_editing = st.session_state.editing_mode.get(idx, False)
-                    
+
                     if is_editing:
                         st.subheader("✏️ Edit Fields")
-                        edited_comparisons = []
-                        for i, comp in enumerate(res["comparisons"]):
-                            st.markdown(f"**{comp['field']}**")
+                        comps = comparisons_df[comparisons_df["result_idx"] == idx]
+                        edited_vals, edited_statuses = [], []
+                        for i, comp in enumerate(comps.itertuples(index=False)):
+                            st.markdown(f"**{comp.field}**")
                             col_a, col_b = st.columns(2)
                             with col_a:
-                                st.text_input("Reference", value=comp['app'], key=f"ref_{idx}_{i}", disabled=True)
+                                st.text_input("Reference", value=comp.app, key=f"ref_{idx}_{i}", disabled=True)
                             with col_b:
-                                new_val = st.text_input("Detected Value", value=comp['label_val'], key=f"edit_{idx}_{i}")
-                            
+                                new_val = st.text_input("Detected Value", value=comp.label_val, key=f"edit_{idx}_{i}")
+
                             # Recalculate status based on edited value
-                            if comp['field'] == "HEALTH WARNING":
-                                new_status = comp['status']  # Keep original for HWS
+                            if comp.field == "HEALTH WARNING":
+                                new_status = comp.status  # Keep original for HWS
                             else:
-                                from thefuzz import fuzz
-                                match_score = fuzz.partial_ratio(comp['app'].lower(), new_val.lower())
+                                from rapidfuzz import fuzz
+                                match_score = fuzz.partial_ratio(comp.app, new_val, processor=str.lower)
                                 new_status = "Match" if match_score > 70 else "Fail"
-                            
-                            edited_comparisons.append({
-                                "field": comp['field'],
-                                "app": comp['app'],
-                                "label_val": new_val,
-                                "status": new_status
-                            })
-                        
+
+                            edited_vals.append(new_val)
+                            edited_statuses.append(new_status)
+
                         col_save, col_cancel = st.columns(2)
                         if col_save.button("Save & Re-submit", key=f"save_{idx}"):
-                            # Update the result with edited values
-                            st.session_state.all_results[idx]["comparisons"] = edited_comparisons
-                            new_ai_status = "Pass" if all(c["status"] == "Match" for c in edited_comparisons) else "Fail"
-                            st.session_state.all_results[idx].update({
-                                "ai_status": new_ai_status,
-                                "final_status": new_ai_status,
-                                "is_human_decision": True
-                            })
+                            # Update the comparison rows with edited values
+                            mask = comparisons_df["result_idx"] == idx
+                            comparisons_df.loc[mask, "label_val"] = edited_vals
+                            comparisons_df.loc[mask, "status"] = edited_statuses
+                            st.session_state.previews[idx] = comparison_preview(comparisons_df[mask])
+                            new_ai_status = "Pass" if all(s == "Match" for s in edited_statuses) else "Fail"
+                            results_df.loc[idx, ["ai_status", "final_status"]] = new_ai_status
+                            results_df.loc[idx, "is_human_decision"] = True
                             st.session_state.editing_mode[idx] = False
                             st.success("Changes saved and re-submitted!")
                             st.rerun()
-                        
+
                         if col_cancel.button("Cancel", key=f"cancel_{idx}"):
                             st.session_state.editing_mode[idx] = False
                             st.rerun()
                     else:
-                        df_preview = pd.DataFrame(res["comparisons"])
-                        df_preview.columns = ["Requirement", "Reference (App)", "Detected on Label", "Status"]
-                        st.table(df_preview)
-                        
-                        if not res.get("is_human_decision"):
+                        st.table(st.session_state.previews.get(idx))
+
+                        if not res["is_human_decision"]:
                             b1, b2, b3 = st.columns(3)
                             if b1.button("✅ OVERRIDE", key=f"p_{idx}"):
-                                st.session_state.all_results[idx].update({"final_status": "Pass", "is_human_decision": True})
+                                results_df.loc[idx, ["final_status", "is_human_decision"]] = ["Pass", True]
                                 st.rerun()
                             if b2.button("❌ CONFIRM FAIL", key=f"f_{idx}"):
-                                st.session_state.all_results[idx].update({"final_status": "Fail", "is_human_decision": True})
+                                results_df.loc[idx, ["final_status", "is_human_decision"]] = ["Fail", True]
                                 st.rerun()
                             if b3.button("✏️ EDIT FIELDS", key=f"e_{idx}"):
                                 st.session_state.editing_mode[idx] = True
@@ -192,31 +227,31 @@ with tab2:
                             st.info(f"Human Decision Recorded: {res['final_status']}")
                             if st.button("✏️ Edit Again", key=f"edit_again_{idx}"):
                                 st.session_state.editing_mode[idx] = True
-                                st.session_state.all_results[idx]["is_human_decision"] = False
+                                results_df.loc[idx, "is_human_decision"] = False
                                 st.rerun()
 
         if st.button("Step 3. Generate Audit Report"):
             current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            report = []
-            for r in st.session_state.all_results:
-                report.append({
-                    "Timestamp": current_time,
-                    "Label": r["label_file"],
-                    "Matched_App": r["app_file"],
-                    "AI_Initial": r["ai_status"],
-                    "Human_Override": "Yes" if r["ai_status"] != r["final_status"] else "No",
-                    "Final_Decision": r["final_status"],
-                    "HWS_Detail": next((c["label_val"] for c in r["comparisons"] if c["field"] == "HEALTH WARNING"), "N/A"),
-                    "Latency": f"{r['processing_time']:.2f}s"
-                })
-            
-            df_report = pd.DataFrame(report)
+            hws_detail = (comparisons_df[comparisons_df["field"] == "HEALTH WARNING"]
+                          .set_index("result_idx")["label_val"])
+            df_report = pd.DataFrame({
+                "Timestamp": current_time,
+                "Label": results_df["label_file"],
+                "Matched_App": results_df["app_file"],
+                "AI_Initial": results_df["ai_status"],
+                "Human_Override": (results_df["ai_status"] != results_df["final_status"]).map({True: "Yes", False: "No"}),
+                "Final_Decision": results_df["final_status"],
+                "HWS_Detail": results_df.index.to_series().map(hws_detail).fillna("N/A"),
+                "Latency": results_df["processing_time"].map("{:.2f}s".format)
+            })
             st.download_button("Step 4.Download CSV Report", df_report.to_csv(index=False), "Audit_Report.csv", "text/csv")
 
 with st.sidebar:
     st.header("System")
     if st.button("Clear Cache & Library"):
-        st.session_state.slib.clear_library()
-        st.session_state.all_results = []
-        st.session_state.uploader_key += 1 
+        slib.clear_library()
+        st.session_state.results_df = None
+        st.session_state.comparisons_df = None
+        st.session_state.previews = {}
+        st.session_state.uploader_key += 1
         st.rerun()
\ No newline at end of file